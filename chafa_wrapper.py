@@ -4,54 +4,197 @@ PixelTerm Chafa封装模块
 统一chafa命令调用和配置
 """
 
+import os
+import shlex
+import shutil
 import subprocess
-from typing import Optional, Tuple, List
-from constants import CHAFA_CMD, DEFAULT_CHAFA_ARGS
+import threading
+from typing import Optional, Tuple
+from constants import CHAFA_CMD, CHAFA_BASE_CMD
+
+# Record separator emitted by the persistent worker after each frame;
+# it never occurs in chafa's ANSI output
+_FRAME_SENTINEL = b'\x1e'
 
 
 class ChafaWrapper:
     """Chafa命令封装器"""
-    
+
+    # Long-lived render worker - chafa has no batch mode, so a small
+    # shell read-loop keeps one process alive and amortizes fork+exec
+    # across all default-geometry renders
+    _worker: Optional[subprocess.Popen] = None
+    _worker_lock = threading.Lock()
+    # Set (lock-free) from signal handlers when the terminal geometry
+    # changes; the next render replaces the worker before using it
+    _worker_stale = False
+
+    @classmethod
+    def _spawn_worker(cls) -> Optional[subprocess.Popen]:
+        """Start the persistent render loop process"""
+        # chafa inside the worker sees only pipes on every fd, so its
+        # own size detection would fall back to 80x25 - bake the real
+        # terminal size into the command line instead. A resize marks
+        # the worker stale, so a respawn picks up the new size.
+        try:
+            tsize = shutil.get_terminal_size()
+            cmd = CHAFA_BASE_CMD + ('--size', f'{tsize.columns}x{tsize.lines}')
+        except Exception:
+            cmd = CHAFA_BASE_CMD
+        chafa = ' '.join(shlex.quote(a) for a in cmd)
+        script = f'while IFS= read -r f; do {chafa} -- "$f"; printf "\\036"; done'
+        try:
+            return subprocess.Popen(
+                ['sh', '-c', script],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, bufsize=0
+            )
+        except Exception:
+            return None
+
+    @classmethod
+    def _render_via_worker(cls, filepath: str) -> Optional[bytes]:
+        """Render through the persistent worker; None means caller should fall back"""
+        # Non-blocking: when another thread (a preloader, usually) is
+        # mid-render, fall back to a one-shot spawn rather than queueing
+        # everyone behind a single chafa process - parallel renders keep
+        # their own processes, the worker only amortizes the serial case
+        if not cls._worker_lock.acquire(blocking=False):
+            return None
+        try:
+            if cls._worker_stale:
+                # Geometry changed since this worker started - drop it
+                cls._worker_stale = False
+                if cls._worker is not None:
+                    try:
+                        cls._worker.kill()
+                    except Exception:
+                        pass
+                    cls._worker = None
+            if cls._worker is None or cls._worker.poll() is not None:
+                cls._worker = cls._spawn_worker()
+            worker = cls._worker
+            if worker is None:
+                return None
+
+            try:
+                worker.stdin.write(filepath.encode() + b'\n')
+                worker.stdin.flush()
+                # bufsize=0 gives a raw FileIO, so read with os.read -
+                # it returns as soon as any output is available
+                out_fd = worker.stdout.fileno()
+                data = bytearray()
+                while not data.endswith(_FRAME_SENTINEL):
+                    chunk = os.read(out_fd, 65536)
+                    if not chunk:
+                        raise BrokenPipeError  # Worker died mid-frame
+                    data += chunk
+                return bytes(data[:-1]) or None
+            except Exception:
+                # Drop the broken worker; a fresh one is spawned next time
+                try:
+                    worker.kill()
+                except Exception:
+                    pass
+                cls._worker = None
+                return None
+        finally:
+            cls._worker_lock.release()
+
+    @classmethod
+    def mark_worker_stale(cls):
+        """Flag the worker for replacement before its next use
+
+        Safe to call from a signal handler: a plain attribute write,
+        no lock - unlike reset_worker, which the main thread may be
+        holding _worker_lock against when the signal arrives.
+        """
+        cls._worker_stale = True
+
+    @classmethod
+    def reset_worker(cls):
+        """Stop the persistent worker (e.g. when render geometry changes)"""
+        with cls._worker_lock:
+            if cls._worker is not None:
+                try:
+                    cls._worker.kill()
+                except Exception:
+                    pass
+                cls._worker = None
+
     @staticmethod
-    def build_command(filepath: str, scale: float = 1.0, size: Optional[Tuple[int, int]] = None) -> List[str]:
+    def build_command(filepath: str, scale: float = 1.0, size: Optional[Tuple[int, int]] = None) -> Tuple[str, ...]:
         """构建chafa命令"""
-        cmd = [CHAFA_CMD] + DEFAULT_CHAFA_ARGS + [filepath]
-        
+        # CHAFA_BASE_CMD is prebuilt, so the common case is one tuple concat
+        cmd = CHAFA_BASE_CMD + (filepath,)
+
         # 如果指定了尺寸，添加尺寸参数
         if size:
             width, height = size
-            cmd.extend(['--size', f'{width}x{height}'])
+            cmd += ('--size', f'{width}x{height}')
         elif scale != 1.0:
             # 如果有缩放需求但没有具体尺寸，需要计算
             import shutil
             term_width, term_height = shutil.get_terminal_size()
             display_width = int(term_width * scale)
             display_height = int(term_height * scale)
-            cmd.extend(['--size', f'{display_width}x{display_height}'])
-        
+            cmd += ('--size', f'{display_width}x{display_height}')
+
         return cmd
     
     @staticmethod
-    def render_image(filepath: str, scale: float = 1.0, size: Optional[Tuple[int, int]] = None) -> Optional[str]:
-        """渲染图片并返回输出"""
+    def render_image_bytes(filepath: str, scale: float = 1.0, size: Optional[Tuple[int, int]] = None) -> Optional[bytes]:
+        """渲染图片并返回原始字节输出"""
+        # Keeping chafa's stdout as raw bytes avoids a UTF-8 decode here
+        # and a matching re-encode when the frame is cached or displayed
         try:
+            # Default geometry renders go through the persistent worker;
+            # custom sizes (and odd filenames) fall back to one-shot spawn
+            if scale == 1.0 and size is None and '\n' not in filepath:
+                rendered = ChafaWrapper._render_via_worker(filepath)
+                if rendered is not None:
+                    return rendered
+
             cmd = ChafaWrapper.build_command(filepath, scale, size)
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
+            result = subprocess.run(cmd, capture_output=True)
+
+            if result.returncode == 0:
+                return result.stdout
+            return None
+        except Exception:
+            return None
+
+    @staticmethod
+    def render_image_data(data: bytes, scale: float = 1.0, size: Optional[Tuple[int, int]] = None) -> Optional[bytes]:
+        """渲染内存中的图片数据（通过stdin管道给chafa）"""
+        try:
+            # stdin carries the image, so chafa cannot probe it for the
+            # terminal size - always pass the geometry explicitly
+            if size is None:
+                tsize = shutil.get_terminal_size()
+                size = (int(tsize.columns * scale), int(tsize.lines * scale))
+            cmd = ChafaWrapper.build_command('-', scale, size)
+            result = subprocess.run(cmd, input=data, capture_output=True)
             if result.returncode == 0:
                 return result.stdout
             return None
         except Exception:
             return None
+
+    @staticmethod
+    def render_image(filepath: str, scale: float = 1.0, size: Optional[Tuple[int, int]] = None) -> Optional[str]:
+        """渲染图片并返回输出"""
+        rendered = ChafaWrapper.render_image_bytes(filepath, scale, size)
+        if rendered is None:
+            return None
+        return rendered.decode('utf-8', 'replace')
     
     @staticmethod
     def check_chafa_available() -> bool:
         """检查chafa是否可用"""
-        try:
-            result = subprocess.run([CHAFA_CMD, '--version'], capture_output=True, check=True)
-            return result.returncode == 0
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return False
+        # A PATH lookup answers "does an executable chafa exist" without
+        # paying fork+exec for a throwaway --version run
+        return shutil.which(CHAFA_CMD) is not None
     
     @staticmethod
     def get_chafa_version() -> Optional[str]:
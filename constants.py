@@ -4,22 +4,31 @@ PixelTerm Constants Definition
 """
 
 # Supported image formats
-SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff'}
+SUPPORTED_FORMATS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff'})
+
+
+def has_image_ext(name: str, _fmts=SUPPORTED_FORMATS) -> bool:
+    """Check if a filename has a supported image extension"""
+    i = name.rfind('.')
+    return i >= 0 and name[i:].lower() in _fmts
 
 # Preload configuration
 DEFAULT_PRELOAD_SIZE = 10
-PRELOAD_SLEEP_TIME = 0.05
+MAX_MEM_CACHE = 3
+MAX_DISK_CACHE_BYTES = 128 * 1024 * 1024
+MAX_SESSION_CACHE = 32
 
 # Chafa command configuration
 CHAFA_CMD = 'chafa'
-DEFAULT_CHAFA_ARGS = [
+DEFAULT_CHAFA_ARGS = (
     '--color-space', 'rgb',
     '--dither', 'none',
     '--relative', 'off',
     '--optimize', '9',
     '--margin-right', '0',
     '--work', '9'
-]
+)
+CHAFA_BASE_CMD = (CHAFA_CMD,) + DEFAULT_CHAFA_ARGS
 
 # Display configuration
 DEFAULT_SCALE = 1.0
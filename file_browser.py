@@ -8,33 +8,74 @@ import os
 import sys
 import tempfile
 import hashlib
+import operator
 import shutil
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Optional, Dict
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
-from constants import SUPPORTED_FORMATS, DEFAULT_PRELOAD_SIZE, PRELOAD_SLEEP_TIME
+from constants import (DEFAULT_PRELOAD_SIZE, MAX_MEM_CACHE, MAX_DISK_CACHE_BYTES,
+                       DEFAULT_CHAFA_ARGS, has_image_ext)
 from chafa_wrapper import ChafaWrapper
 
+# Baked into the cache key so entries are invalidated when render flags change
+_CHAFA_ARGS_KEY = '|'.join(DEFAULT_CHAFA_ARGS)
+
+
+@lru_cache(maxsize=512)
+def _cache_name(path_str: str, temp_dir: str) -> Path:
+    """Map an absolute image path to its cache file path"""
+    # The hash is only a filename, no cryptographic strength needed -
+    # BLAKE2b with a short digest is much cheaper than MD5 here
+    digest = hashlib.blake2b(path_str.encode(), digest_size=16).hexdigest()
+    return Path(temp_dir) / f"{digest}.z"
+
 
 class FileBrowser:
     """File browser"""
     
     def __init__(self):
         self.current_directory = Path.cwd()
-        self.image_files: List[Path] = []
+        # Paths are kept as plain strings internally - cheaper to sort,
+        # hash and store than Path objects for large directories
+        self.image_files: List[str] = []
+        self._index_by_path: Dict[str, int] = {}
         self.current_index = 0
         
-        # chafa pre-render cache - keep only current image and one before/after in memory
-        self.render_cache: Dict[Path, str] = {}
+        # chafa pre-render cache - small LRU, evicted on insert
+        self.render_cache: 'OrderedDict[str, bytes]' = OrderedDict()
         self.preload_size = DEFAULT_PRELOAD_SIZE
         self.preload_enabled = True
         
-        # Temporary file cache directory
-        self.temp_dir = tempfile.mkdtemp(prefix="pixelterm_cache_")
+        # Persistent render cache directory - entries are keyed by
+        # (path, mtime, size, chafa args) so they survive across runs
+        try:
+            cache_root = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+            cache_dir = cache_root / 'pixelterm'
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            self.temp_dir = str(cache_dir)
+            self._cache_is_persistent = True
+        except Exception:
+            # Fall back to a throwaway per-run directory
+            self.temp_dir = tempfile.mkdtemp(prefix="pixelterm_cache_")
+            self._cache_is_persistent = False
         self.file_cache_range = 10  # Store 10 images before/after to temporary files
-        
-        # Thread pool for pre-rendering
-        self.render_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chafa_render")
+
+        # Last navigation direction (+1 next, -1 previous) biases preload order
+        self._last_direction = 1
+
+        # Preload generation - bumped on every navigation so workers from
+        # superseded neighborhoods stop rendering instead of wasting CPU
+        self._preload_gen = 0
+
+        # Thread pool for pre-rendering - chafa is CPU-bound, so scale
+        # with the machine but keep the terminal responsive
+        self.render_executor = ThreadPoolExecutor(
+            max_workers=min(os.cpu_count() or 2, 4),
+            thread_name_prefix="chafa_render"
+        )
     
     def set_directory(self, directory: str) -> bool:
         """Set current directory"""
@@ -75,21 +116,24 @@ class FileBrowser:
             # Set file's directory
             self.current_directory = path.parent
             self.refresh_file_list()
-            
+
+            path_str = str(path)
+
             # Find current file index in list
-            for i, img_file in enumerate(self.image_files):
-                if img_file == path:
-                    self.current_index = i
-                    return True
-            
+            idx = self._index_by_path.get(path_str)
+            if idx is not None:
+                self.current_index = idx
+                return True
+
             # If not found, add to list
-            self.image_files.append(path)
+            self.image_files.append(path_str)
             self.image_files.sort()
-            for i, img_file in enumerate(self.image_files):
-                if img_file == path:
-                    self.current_index = i
-                    return True
-            
+            self._index_by_path = {p: i for i, p in enumerate(self.image_files)}
+            idx = self._index_by_path.get(path_str)
+            if idx is not None:
+                self.current_index = idx
+                return True
+
             return False
             
         except Exception as e:
@@ -100,17 +144,22 @@ class FileBrowser:
         """Refresh current directory's image file list"""
         self.image_files.clear()
         self.render_cache.clear()  # Clear memory cache
-        
-        # Clear temporary file cache
-        self._clear_temp_cache()
-        
+
+        # Trim the persistent disk cache in the background
+        self.render_executor.submit(self._evict_disk_cache)
+
         try:
-            for item in self.current_directory.iterdir():
-                if item.is_file() and self.is_image_file(item):
-                    self.image_files.append(item)
-            
-            # Sort by filename
-            self.image_files.sort()
+            # os.scandir reuses directory-entry metadata, avoiding one stat() per file
+            found = []
+            with os.scandir(self.current_directory) as entries:
+                for entry in entries:
+                    if has_image_ext(entry.name) and entry.is_file(follow_symlinks=False):
+                        found.append((entry.name, entry.path))
+
+            # Sort by filename - plain string compares, no Path objects
+            found.sort(key=operator.itemgetter(0))
+            self.image_files[:] = [p for _, p in found]
+            self._index_by_path = {p: i for i, p in enumerate(self.image_files)}
             self.current_index = 0
             
             # Start pre-rendering
@@ -123,155 +172,188 @@ class FileBrowser:
         """Pre-render images"""
         if not self.image_files or not self.preload_enabled:
             return
-        
-        # Submit pre-render tasks to thread pool
-        self.render_executor.submit(self._render_worker)
+
+        # Submit pre-render tasks to thread pool; bumping the generation
+        # lets tasks queued for an older position bail out early
+        self._preload_gen += 1
+        self.render_executor.submit(self._render_worker, self._preload_gen)
     
     
     
-    def _render_worker(self):
-        """Pre-render worker thread"""
-        import time
+    def _render_worker(self, gen: int):
+        """Pre-render dispatcher - submits one task per neighboring image"""
         try:
-            # Pre-render 10 images before/after current to temporary files
-            start_idx = max(0, self.current_index - self.file_cache_range)
-            end_idx = min(len(self.image_files), self.current_index + self.file_cache_range + 1)
-            
-            for i in range(start_idx, end_idx):
-                if i != self.current_index:  # Skip current image
-                    img_path = self.image_files[i]
-                    
-                    # Check if already cached to temporary file
-                    if not self._get_cache_file_path(img_path).exists():
-                        try:
-                            # Use ChafaWrapper to pre-render
-                            rendered = ChafaWrapper.render_image(str(img_path))
-                            if rendered:
-                                # Save to temporary file
-                                self._save_to_temp_cache(img_path, rendered)
-                                
-                                # If in memory cache range, also save to memory
-                                if self._is_in_memory_range(img_path):
-                                    self.render_cache[img_path] = rendered
-                            
-                            time.sleep(PRELOAD_SLEEP_TIME)  # Avoid using too much CPU
-                        except Exception:
-                            pass  # Ignore failed rendering
-            
-            # Clear memory cache, keep only current image and one before/after
-            self._cleanup_memory_cache()
-            
+            if gen != self._preload_gen:
+                return  # Superseded by a newer navigation
+
+            current = self.current_index
+            direction = self._last_direction
+
+            # Fan outwards from the current image, starting in the
+            # navigation direction: current+1, current-1, current+2, ...
+            for step in range(1, self.file_cache_range + 1):
+                for offset in (step * direction, -step * direction):
+                    i = current + offset
+                    if 0 <= i < len(self.image_files):
+                        self.render_executor.submit(self._render_one, i, gen)
+
         except Exception:
             pass  # Ignore pre-rendering errors
-    
-    def _cleanup_memory_cache(self):
-        """Clean up memory cache, keep only current image and one before/after"""
-        if not self.image_files:
-            return
-        
-        # Find images that should be kept in memory
-        to_keep = set()
-        start_idx = max(0, self.current_index - 1)
-        end_idx = min(len(self.image_files), self.current_index + 2)
-        
-        for i in range(start_idx, end_idx):
-            to_keep.add(self.image_files[i])
-        
-        # Clean up memory cache not in retention range
-        to_remove = []
-        for img_path in self.render_cache:
-            if img_path not in to_keep:
-                to_remove.append(img_path)
-        
-        for img_path in to_remove:
-            del self.render_cache[img_path]
-    
-    def _get_cache_file_path(self, img_path: Path) -> Path:
+
+    def _render_one(self, index: int, gen: int):
+        """Pre-render a single image to the temporary file cache"""
+        try:
+            if gen != self._preload_gen:
+                return  # Superseded by a newer navigation
+
+            img_path = self.image_files[index]
+            cache_file = self._get_cache_file_path(img_path)
+
+            # Claim the cache slot atomically: O_EXCL both detects an
+            # existing entry and creates the file in a single syscall,
+            # replacing the separate exists() stat and racy write
+            try:
+                fd = os.open(cache_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                return  # Already cached (or being rendered by another worker)
+
+            rendered = None
+            try:
+                # Use ChafaWrapper to pre-render, keeping the frame as bytes
+                rendered = ChafaWrapper.render_image_bytes(img_path)
+                if rendered:
+                    os.write(fd, zlib.compress(rendered, 1))
+            finally:
+                os.close(fd)
+                if not rendered:
+                    # Don't leave an empty claim file behind on failure
+                    try:
+                        os.remove(cache_file)
+                    except OSError:
+                        pass
+
+            # If in memory cache range, also save to memory
+            if rendered and self._is_in_memory_range(img_path):
+                self._store_in_memory_cache(img_path, rendered)
+
+        except Exception:
+            pass  # Ignore failed rendering
+
+    def _store_in_memory_cache(self, img_path: str, rendered_data: bytes):
+        """Insert into the LRU memory cache, evicting the oldest entry if full"""
+        self.render_cache[img_path] = rendered_data
+        self.render_cache.move_to_end(img_path)
+        while len(self.render_cache) > MAX_MEM_CACHE:
+            self.render_cache.popitem(last=False)
+    
+    def _get_cache_file_path(self, img_path: str) -> Path:
         """Get cache file path for image"""
-        # Use file path hash as cache filename to avoid long paths and special characters
-        path_str = str(img_path.absolute())
-        hash_obj = hashlib.md5(path_str.encode())
-        cache_filename = f"{hash_obj.hexdigest()}.txt"
-        return Path(self.temp_dir) / cache_filename
-    
-    def _clear_temp_cache(self):
-        """Clear temporary file cache"""
+        # Hash path plus stat info so edited/replaced images miss the old
+        # entry, and stale entries simply age out of the eviction sweep.
+        # Terminal geometry is part of the key: the cache is persistent,
+        # so a frame rendered at one size must never be replayed at
+        # another. Paths from scandir/resolve are already absolute.
+        path_str = img_path
         try:
-            if hasattr(self, 'temp_dir') and self.temp_dir and os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
-            self.temp_dir = tempfile.mkdtemp(prefix="pixelterm_cache_")
+            tsize = shutil.get_terminal_size()
+            geom = f"{tsize.columns}x{tsize.lines}"
         except Exception:
-            pass
-    
-    def _save_to_temp_cache(self, img_path: Path, rendered_data: str):
-        """Save rendered data to temporary file"""
+            geom = "80x24"
         try:
-            cache_file = self._get_cache_file_path(img_path)
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                f.write(rendered_data)
+            st = os.stat(img_path)
+            key = f"{path_str}|{st.st_mtime_ns}|{st.st_size}|{geom}|{_CHAFA_ARGS_KEY}"
+        except OSError:
+            key = f"{path_str}|{geom}|{_CHAFA_ARGS_KEY}"
+        return _cache_name(key, self.temp_dir)
+
+    def _evict_disk_cache(self):
+        """Delete oldest cache files until the cache fits MAX_DISK_CACHE_BYTES"""
+        try:
+            entries = []
+            total = 0
+            with os.scandir(self.temp_dir) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+
+            if total <= MAX_DISK_CACHE_BYTES:
+                return
+
+            entries.sort()  # Oldest first
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= MAX_DISK_CACHE_BYTES:
+                    break
         except Exception:
             pass
     
-    def _load_from_temp_cache(self, img_path: Path) -> Optional[str]:
+    def _load_from_temp_cache(self, img_path: str) -> Optional[bytes]:
         """Load rendered data from temporary file"""
         try:
-            cache_file = self._get_cache_file_path(img_path)
-            if cache_file.exists():
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    return f.read()
+            # No exists() pre-check: a missing file just raises, saving a stat()
+            data = self._get_cache_file_path(img_path).read_bytes()
+            return zlib.decompress(data)
+        except FileNotFoundError:
+            return None
         except Exception:
-            pass
-        return None
+            return None
     
-    def _is_in_memory_range(self, img_path: Path) -> bool:
+    def _is_in_memory_range(self, img_path: str) -> bool:
         """Check if image should be in memory cache range (current and one before/after)"""
         if not self.image_files:
             return False
-        
-        try:
-            img_index = self.image_files.index(img_path)
-            return abs(img_index - self.current_index) <= 1
-        except ValueError:
-            return False
+
+        idx = self._index_by_path.get(img_path)
+        return idx is not None and abs(idx - self.current_index) <= 1
     
-    def get_rendered_image(self, img_path: Path) -> Optional[str]:
-        """Get pre-rendered image data"""
+    def get_rendered_image(self, img_path: str) -> Optional[bytes]:
+        """Get pre-rendered image data as terminal-ready bytes"""
         # First check memory cache
-        if img_path in self.render_cache:
-            return self.render_cache[img_path]
-        
+        cached = self.render_cache.get(img_path)
+        if cached is not None:
+            self.render_cache.move_to_end(img_path)
+            return cached
+
         # If not in memory cache, try loading from temporary file
         cached_data = self._load_from_temp_cache(img_path)
         if cached_data:
             # If image is in memory cache range, load to memory
             if self._is_in_memory_range(img_path):
-                self.render_cache[img_path] = cached_data
+                self._store_in_memory_cache(img_path, cached_data)
             return cached_data
-        
+
         return None
     
     def cleanup(self):
         """Clean up resources"""
         if hasattr(self, 'render_executor'):
             self.render_executor.shutdown(wait=False)
-        
-        # Clear temporary file cache
+
+        # The persistent cache stays for the next run; only remove the
+        # fallback per-run directory
         try:
-            if hasattr(self, 'temp_dir') and self.temp_dir and os.path.exists(self.temp_dir):
+            if (hasattr(self, 'temp_dir') and self.temp_dir
+                    and not self._cache_is_persistent and os.path.exists(self.temp_dir)):
                 shutil.rmtree(self.temp_dir)
         except Exception:
             pass
     
     def is_image_file(self, filepath: Path) -> bool:
         """Check if file is supported image format"""
-        return filepath.suffix.lower() in SUPPORTED_FORMATS
+        return has_image_ext(filepath.name)
     
     def get_image_count(self) -> int:
         """Get current directory image count"""
         return len(self.image_files)
     
-    def get_current_image(self) -> Optional[Path]:
-        """Get current image path"""
+    def get_current_image(self) -> Optional[str]:
+        """Get current image path as a string"""
         if 0 <= self.current_index < len(self.image_files):
             return self.image_files[self.current_index]
         return None
@@ -282,7 +364,8 @@ class FileBrowser:
             return False
         
         self.current_index = (self.current_index + 1) % len(self.image_files)
-        
+        self._last_direction = 1
+
         # 更新内存缓存，确保当前图片在内存中
         self._update_memory_cache_on_switch()
         
@@ -296,7 +379,8 @@ class FileBrowser:
             return False
         
         self.current_index = (self.current_index - 1) % len(self.image_files)
-        
+        self._last_direction = -1
+
         # 更新内存缓存，确保当前图片在内存中
         self._update_memory_cache_on_switch()
         
@@ -310,15 +394,12 @@ class FileBrowser:
             return
         
         # 确保当前图片在内存缓存中
-        current_img = self.get_current_image()
+        current_img = self.image_files[self.current_index] if self.image_files else None
         if current_img and current_img not in self.render_cache:
             # 尝试从临时文件加载
             cached_data = self._load_from_temp_cache(current_img)
             if cached_data:
-                self.render_cache[current_img] = cached_data
-        
-        # 清理不在内存范围内的缓存
-        self._cleanup_memory_cache()
+                self._store_in_memory_cache(current_img, cached_data)
     
     
     
@@ -352,9 +433,10 @@ class FileBrowser:
         """Get subdirectories of current directory"""
         subdirs = []
         try:
-            for item in self.current_directory.iterdir():
-                if item.is_dir() and not item.name.startswith('.'):
-                    subdirs.append(item.name)
+            with os.scandir(self.current_directory) as entries:
+                for entry in entries:
+                    if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
             subdirs.sort()
         except Exception:
             pass
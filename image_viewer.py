@@ -4,14 +4,38 @@ PixelTerm Image Display Module
 Uses chafa command line tool to display images in terminal
 """
 
-import os
-import subprocess
+import io
+import shutil
+import signal
 import sys
+from functools import lru_cache
 from typing import Optional, Tuple
 from pathlib import Path
-from PIL import Image
 from chafa_wrapper import ChafaWrapper
 
+# Constant ANSI sequences, pre-encoded so per-frame writes skip both
+# string formatting and TextIOWrapper encoding
+_HIDE_CURSOR = b'\033[?25l'
+_SHOW_CURSOR = b'\033[?25h'
+# Home + erase-to-end: same coverage as \033[2J but terminals don't
+# treat it as a full screen reset (no scrollback churn)
+_FULL_CLEAR = b'\033[H\033[J'
+
+
+@lru_cache(maxsize=256)
+def _center_filename(filename: str, term_width: int) -> str:
+    """Build the centered (or truncated) filename line for a terminal width"""
+    filename_len = len(filename)
+    if filename_len < term_width:
+        # 计算左边距以居中显示
+        left_padding = (term_width - filename_len) // 2
+        return ' ' * left_padding + filename
+    # If filename is too long, truncate and add ellipsis
+    max_len = term_width - 3  # 留出省略号的空间
+    if max_len > 0:
+        return filename[:max_len] + '...'
+    return '...'
+
 
 class ImageViewer:
     """Terminal image viewer"""
@@ -21,112 +45,199 @@ class ImageViewer:
         self.height = height
         from constants import SUPPORTED_FORMATS
         self.supported_formats = SUPPORTED_FORMATS
-    
+        # Height of the last rendered frame, for differential clearing
+        self._last_image_lines: Optional[int] = None
+        # Terminal size cache, invalidated by SIGWINCH instead of
+        # issuing an ioctl on every query
+        self._term_size_cache: Optional[Tuple[int, int]] = None
+        try:
+            signal.signal(signal.SIGWINCH, self._on_resize)
+        except (ValueError, AttributeError, OSError):
+            # Not the main thread or no SIGWINCH on this platform
+            pass
+
+    def _on_resize(self, signum=None, frame=None):
+        """SIGWINCH handler - drop the cached terminal size"""
+        self._term_size_cache = None
+        # Frame geometry changed, next clear must wipe the whole screen
+        self._last_image_lines = None
+        # The persistent chafa worker sized itself for the old terminal;
+        # flag it stale so the next render replaces it. This runs in
+        # signal context, so it must not touch the worker lock - the
+        # main thread may hold it mid-render when SIGWINCH lands
+        ChafaWrapper.mark_worker_stale()
+
     def get_terminal_size(self) -> Tuple[int, int]:
         """Get terminal size"""
+        if self._term_size_cache is not None:
+            return self._term_size_cache
         try:
-            import shutil
             size = shutil.get_terminal_size()
-            return size.columns, size.lines
+            self._term_size_cache = (size.columns, size.lines)
         except:
-            return 80, 24
+            self._term_size_cache = (80, 24)
+        return self._term_size_cache
     
     
     
     def is_image_file(self, filepath: str) -> bool:
         """Check if file is supported image format"""
-        _, ext = os.path.splitext(filepath.lower())
-        return ext in self.supported_formats
+        from constants import has_image_ext
+        return has_image_ext(filepath)
     
     
     
-    def display_image(self, filepath: str, scale: float = 1.0, file_browser=None) -> bool:
-        """Display image using chafa"""
+    def _emit(self, data: bytes, out: Optional[bytearray] = None):
+        """Append to the frame buffer, or write through when unbuffered"""
+        if out is None:
+            sys.stdout.buffer.write(data)
+        else:
+            out += data
+
+    def _downsample_for_terminal(self, filepath: str) -> Optional[bytes]:
+        """Shrink a very large image before chafa decodes it
+
+        A terminal frame only needs a few hundred thousand pixels, so a
+        multi-megapixel source is reduced with PIL (draft mode lets JPEG
+        decode at a fraction of full size) and handed to chafa as PNG
+        bytes. Returns None when no downsampling applies.
+        """
+        try:
+            from PIL import Image, ImageOps
+        except Exception:
+            # Pillow unavailable - chafa decodes the original itself
+            return None
+        try:
+            term_width, term_height = self.get_terminal_size()
+            # ~4x the cell count per axis keeps plenty of detail for
+            # chafa's own scaler while bounding the pixel budget
+            max_w, max_h = term_width * 4, term_height * 4
+            with Image.open(filepath) as img:
+                # Small enough already - not worth a re-encode round-trip
+                if img.width <= max_w * 2 and img.height <= max_h * 2:
+                    return None
+                img.draft('RGB', (max_w, max_h))
+                # The PNG re-encode strips EXIF, so apply the camera
+                # orientation now or phone portraits come out rotated
+                img = ImageOps.exif_transpose(img)
+                resample = getattr(Image, 'Resampling', Image).BILINEAR
+                img.thumbnail((max_w, max_h), resample)
+                buf = io.BytesIO()
+                img.save(buf, 'PNG')
+                return buf.getvalue()
+        except Exception:
+            return None
+
+    def render_bytes(self, filepath: str, scale: float = 1.0, file_browser=None) -> Optional[bytes]:
+        """Return the terminal-ready frame for an image without displaying it
+
+        Serves from the browser's pre-render cache when possible, so
+        background workers and the display path share one entry point.
+        """
         try:
-            # Try to use pre-rendered data
             rendered_output = None
             if file_browser:
-                rendered_output = file_browser.get_rendered_image(Path(filepath))
-            
+                rendered_output = file_browser.get_rendered_image(filepath)
+
+            if rendered_output is None:
+                # Huge sources get downsampled first and piped to chafa
+                # via stdin; everything else renders from the path
+                reduced = self._downsample_for_terminal(filepath)
+                if reduced is not None:
+                    rendered_output = ChafaWrapper.render_image_data(reduced, scale)
+
+            if rendered_output is None:
+                rendered_output = ChafaWrapper.render_image_bytes(filepath, scale)
+
+            return rendered_output or None
+        except Exception:
+            return None
+
+    def display_image(self, filepath: str, scale: float = 1.0, file_browser=None,
+                      out: Optional[bytearray] = None,
+                      rendered: Optional[bytes] = None) -> bool:
+        """Display image using chafa"""
+        try:
+            # Cache-first render shared with the background workers;
+            # callers holding an already-rendered frame pass it directly
+            rendered_output = rendered
+            if rendered_output is None:
+                rendered_output = self.render_bytes(filepath, scale, file_browser)
+
             if rendered_output:
-                # Use pre-rendered data, output directly
-                print(rendered_output, end='')
+                # Frames stay raw bytes from chafa to terminal - no decode
+                # or re-encode round-trip through TextIOWrapper
+                self._emit(rendered_output, out)
+                # Remember frame height so the next clear only touches
+                # these lines; chafa output is newline-terminated, so
+                # the newline count is the row count
+                self._last_image_lines = rendered_output.count(b'\n')
                 return True
-            
-            # If no pre-rendered data, use ChafaWrapper for real-time rendering
-            rendered = ChafaWrapper.render_image(filepath, scale)
-            if rendered:
-                print(rendered, end='')
-                return True
-            
+
             return False
                 
         except Exception:
             return False
     
-    def clear_display_area(self):
+    def clear_display_area(self, out: Optional[bytearray] = None):
         """Clear current display area"""
-        term_width, term_height = self.get_terminal_size()
-        # Move cursor to top-left corner
-        print('\033[H', end='', flush=True)
-        # Clear entire screen
-        print('\033[2J', end='', flush=True)
-        # Flush output immediately to ensure clear command takes effect
-        sys.stdout.flush()
+        prev_lines = self._last_image_lines
+        if prev_lines:
+            # Only wipe the rows the previous frame occupied (plus the
+            # filename line) instead of forcing a full-screen repaint.
+            # Capped below the last row so the trailing LF never lands
+            # on the bottom line and scrolls the terminal
+            _, term_height = self.get_terminal_size()
+            rows = min(prev_lines + 1, term_height - 1)
+            seq = b'\033[H' + b'\033[K\n' * rows + b'\033[H'
+        else:
+            # Unknown previous frame - fall back to a full clear
+            seq = _FULL_CLEAR
+        self._emit(seq, out)
     
-    def display_filename(self, filepath: str):
+    def display_filename(self, filepath: str, out: Optional[bytearray] = None):
         """Display filename centered below image"""
         try:
-            # Get terminal width
-            term_width, _ = self.get_terminal_size()
+            # Get terminal size once for both centering and positioning
+            term_width, term_height = self.get_terminal_size()
             
             # Get filename (without path)
             filename = Path(filepath).name
+
+            # Centered line is memoized per (filename, width) pair
+            centered_filename = _center_filename(filename, term_width)
             
-            # Calculate center position
-            filename_len = len(filename)
-            if filename_len < term_width:
-                # 计算左边距以居中显示
-                left_padding = (term_width - filename_len) // 2
-                centered_filename = ' ' * left_padding + filename
-            else:
-                # If filename is too long, truncate and add ellipsis
-                max_len = term_width - 3  # 留出省略号的空间
-                if max_len > 0:
-                    centered_filename = filename[:max_len] + '...'
-                else:
-                    centered_filename = '...'
-            
-            # Move to bottom of terminal (second to last line)
-            print(f'\033[{self.get_terminal_size()[1]-1};1H', end='')
-            
-            # Clear line and display filename
-            print('\033[K', end='')  # 清除当前行
-            print(f'\033[36m{centered_filename}\033[0m', end='')  # Display filename in cyan
-            
-            # Flush output immediately
-            sys.stdout.flush()
+            # Move to the second-to-last line, clear it, and print the
+            # filename in cyan - assembled once and written in one go
+            line = f'\033[{term_height-1};1H\033[K\033[36m{centered_filename}\033[0m'
+            self._emit(line.encode('utf-8', 'replace'), out)
         except Exception:
             # If filename display fails, ignore silently
             pass
     
-    def display_image_with_info(self, filepath: str, scale: float = 1.0, clear_first: bool = True, file_browser=None) -> bool:
+    def display_image_with_info(self, filepath: str, scale: float = 1.0, clear_first: bool = True, file_browser=None,
+                                rendered: Optional[bytes] = None) -> bool:
         """Display image"""
+        # Assemble the whole frame in one buffer so the terminal gets a
+        # single write - no flicker from clear and image arriving apart
+        frame = bytearray()
         if clear_first:
             # Clear display area
-            self.clear_display_area()
-        print('\033[?25l', end='')  # Hide cursor
-        
+            self.clear_display_area(out=frame)
+        frame += _HIDE_CURSOR
+
         # Display image
-        result = self.display_image(filepath, scale, file_browser)
-        
+        result = self.display_image(filepath, scale, file_browser, out=frame, rendered=rendered)
+
         # Display filename centered below image
         if result:
-            self.display_filename(filepath)
-        
+            self.display_filename(filepath, out=frame)
+
         # Show cursor after display
-        print('\033[?25h', end='', flush=True)  # Show cursor
-        
+        frame += _SHOW_CURSOR
+        sys.stdout.buffer.write(frame)
+        sys.stdout.buffer.flush()
+
         return result
 
 
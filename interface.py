@@ -52,8 +52,10 @@ class Interface:
         """获取键盘输入"""
         try:
             if self.old_settings:
-                # 原始模式 - 无超时，直接等待
-                return sys.stdin.read(1)
+                # 原始模式 - one read() grabs a whole escape sequence at
+                # once instead of one syscall per byte
+                data = os.read(sys.stdin.fileno(), 8)
+                return data.decode('latin-1') if data else None
             else:
                 # 普通模式
                 return input().strip()
@@ -95,9 +97,9 @@ class Interface:
                 print(f"📸 Image Details")
                 print(f"{'='*60}")
                 
-                # Basic information
-                print(f"📁 Filename: {image_path.name}")
-                print(f"📂 Path: {image_path.parent}")
+                # Basic information (image_path is a plain string)
+                print(f"📁 Filename: {os.path.basename(image_path)}")
+                print(f"📂 Path: {os.path.dirname(image_path)}")
                 print(f"📄 Index: {current_index + 1}/{total_count}")
                 
                 # File size
@@ -181,22 +183,51 @@ class Interface:
 
 class InputHandler:
     """输入处理器"""
-    
+
     def __init__(self, interface: Interface):
         self.interface = interface
         self.handlers = {}
         self.running = True
-    
+        # Key-sequence trie: each node maps the next character to either
+        # a child node (dict) or a handler (callable) at sequence end
+        self._trie = {}
+        self._state = self._trie
+
     def register_handler(self, key: str, handler: Callable):
         """注册按键处理函数"""
         self.handlers[key] = handler
-    
+        # The trie is keyed on raw byte values so the main loop can feed
+        # os.read output directly, without decoding to str first
+        seq = key.encode('latin-1')
+        node = self._trie
+        for b in seq[:-1]:
+            node = node.setdefault(b, {})
+        node[seq[-1]] = handler
+
+    def feed(self, data: bytes):
+        """逐字节驱动按键状态机"""
+        # One dict lookup per byte; partial escape sequences keep their
+        # state across feed() calls until completed or abandoned
+        for b in data:
+            nxt = self._state.get(b)
+            if nxt is None and self._state is not self._trie:
+                # Dead end mid-sequence - drop the partial match and
+                # retry this byte from the root
+                nxt = self._trie.get(b)
+            if nxt is None:
+                self._state = self._trie
+            elif callable(nxt):
+                self._state = self._trie
+                nxt()
+            else:
+                self._state = nxt
+
     def handle_input(self, key: str) -> bool:
         """处理输入"""
         if key in self.handlers:
             return self.handlers[key]()
         return False
-    
+
     def stop(self):
         """停止处理循环"""
         self.running = False
@@ -5,25 +5,66 @@ PixelTerm - 终端图片浏览器主程序
 
 import sys
 import os
+import functools
+import select
 import signal
+import stat
 import argparse
-from pathlib import Path
-from constants import KEY_LEFT, KEY_RIGHT, KEY_LEFT_ALT, KEY_RIGHT_ALT, KEY_CTRL_C, ERR_CHAFA_NOT_FOUND, ERR_CHAFA_INSTALL_HINT
+from collections import OrderedDict
+from constants import KEY_LEFT, KEY_RIGHT, KEY_LEFT_ALT, KEY_RIGHT_ALT, KEY_CTRL_C, MAX_SESSION_CACHE, ERR_CHAFA_NOT_FOUND, ERR_CHAFA_INSTALL_HINT
 from exceptions import ChafaNotFoundError
 
-# 添加当前目录到Python路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+_EPILOG = """
+Usage examples:
+  %(prog)s                    # Browse images in current directory
+  %(prog)s /path/to/images    # Browse images in specified directory
+  %(prog)s image.jpg          # Display specified image directly
+  %(prog)s --no-preload       # Disable preloading for faster startup
+  %(prog)s --help             # Show help information
 
-from image_viewer import ImageViewer
-from file_browser import FileBrowser
-from interface import Interface, InputHandler
-from config import Config, DisplayOptions
+Shortcuts:
+  ←/→        Previous/Next image
+  a/d        Alternative left/right keys
+  i          Show/hide image information
+  r          Delete current image
+  q          Quit program
+  Ctrl+C     Force exit
+"""
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser (once, at import time)"""
+    parser = argparse.ArgumentParser(
+        description='PixelTerm - Terminal Image Viewer',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=_EPILOG
+    )
+    parser.add_argument('path', nargs='?', help='Image file or directory path')
+    parser.add_argument('--no-preload', action='store_false', dest='preload_enabled',
+                        help='Disable preloading feature (enabled by default)')
+    return parser
+
+
+_PARSER = _build_parser()
+
+
+@functools.lru_cache(maxsize=1)
+def _help_text() -> str:
+    """Formatted help output, rendered once on first use"""
+    return _PARSER.format_help()
 
 
 class PixelTerm:
     """主应用程序类"""
     
     def __init__(self, path: str = None, preload_enabled: bool = True):
+        # Heavy siblings are imported here rather than at module load so
+        # that --help/--version never pay for them
+        from image_viewer import ImageViewer
+        from file_browser import FileBrowser
+        from interface import Interface, InputHandler
+        from config import Config, DisplayOptions
+
         self.config = Config()
         self.display_options = DisplayOptions(self.config)
         self.interface = Interface()
@@ -31,24 +72,45 @@ class PixelTerm:
         self.file_browser = FileBrowser()
         self.input_handler = InputHandler(self.interface)
         
-        # 按键序列缓冲区
-        self.key_buffer = ""
-        
         # Info display state
         self.info_displayed = False
+
+        # (path, scale, term size) of the last frame drawn, so identical
+        # refresh requests can be dropped without touching chafa
+        self._last_frame_key = None
+
+        # Session-wide LRU of rendered frames keyed by
+        # (path, width, height, scale) - revisiting an image at the same
+        # geometry replays the bytes instead of re-rendering
+        self._session_cache: 'OrderedDict[tuple, bytes]' = OrderedDict()
+
+        # Prefetch renders still in flight, keyed like the session
+        # cache, so the display path can wait on a pending render
+        # instead of starting the same chafa job again
+        self._inflight = {}
+
+        # Failed background unlinks, queued by the executor callback
+        # and reported from the main loop (which owns the terminal)
+        self._delete_failures = []
         
         # 设置预加载状态
         self.file_browser.preload_enabled = preload_enabled
         
-        # 设置初始路径
+        # 设置初始路径 - one stat() and branch on the mode bits instead
+        # of separate is_file()/is_dir() probes
         if path:
-            path_obj = Path(path)
-            if path_obj.is_file():
+            try:
+                st = os.stat(path)
+            except OSError:
+                print(f"Error: Path does not exist {path}")
+                sys.exit(1)
+
+            if stat.S_ISREG(st.st_mode):
                 # 如果是文件，设置为图片文件
                 if not self.file_browser.set_image_file(path):
                     print(f"Cannot open image file: {path}")
                     sys.exit(1)
-            elif path_obj.is_dir():
+            elif stat.S_ISDIR(st.st_mode):
                 # 如果是目录，设置为目录
                 if not self.file_browser.set_directory(path):
                     print(f"Cannot open directory: {path}")
@@ -61,9 +123,17 @@ class PixelTerm:
         
         # 注册键盘事件处理器
         self.setup_key_handlers()
-        
+
+        # Self-pipe so signal handlers can wake the blocking select loop
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+
         # 设置信号处理
         signal.signal(signal.SIGINT, self.signal_handler)
+        try:
+            signal.signal(signal.SIGWINCH, self._on_winch)
+        except (ValueError, AttributeError, OSError):
+            pass
     
     def setup_key_handlers(self):
         """Setup keyboard event handlers"""
@@ -88,139 +158,215 @@ class PixelTerm:
     
     def signal_handler(self, signum, frame):
         """Signal handler"""
-        # Force exit, skip confirmation
-        self.input_handler.stop()
-    
+        # Keep the handler minimal: one write to the self-pipe both
+        # requests the quit and unblocks select immediately
+        try:
+            os.write(self._wake_w, b'q')
+        except OSError:
+            pass
+
+    def _on_winch(self, signum=None, frame=None):
+        """SIGWINCH handler - invalidate sizes and wake the main loop"""
+        self.image_viewer._on_resize()
+        # Frames for the old geometry will never be replayed. The
+        # browser's memory cache holds them too and would otherwise
+        # serve one to the forced repaint; the disk tier keys on
+        # geometry, so its old entries just stop matching
+        self._session_cache.clear()
+        self.file_browser.render_cache.clear()
+        try:
+            os.write(self._wake_w, b'w')
+        except OSError:
+            pass
+
+    def _render_frame(self, key, filepath: str, scale: float):
+        """Render one frame and publish it to the session cache"""
+        rendered = self.image_viewer.render_bytes(filepath, scale, self.file_browser)
+        if rendered:
+            self._session_cache[key] = rendered
+            while len(self._session_cache) > MAX_SESSION_CACHE:
+                self._session_cache.popitem(last=False)
+        return rendered
+
+    def _render_cached(self, filepath: str, scale: float):
+        """Render a frame through the session LRU cache"""
+        width, height = self.term_size()
+        key = (filepath, width, height, scale)
+        rendered = self._session_cache.get(key)
+        if rendered is not None:
+            self._session_cache.move_to_end(key)
+            return rendered
+
+        # A prefetch worker may already be rendering this frame - wait
+        # for its result instead of running the same chafa job twice
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                return None
+
+        return self._render_frame(key, filepath, scale)
+
+    def _prefetch_ahead(self):
+        """Warm the session cache for the next images in nav direction
+
+        Rendering overlaps with human reaction time, so by the next
+        keypress the frame is usually already in the session cache.
+        """
+        files = self.file_browser.image_files
+        if not files or not self.file_browser.preload_enabled:
+            return
+        direction = self.file_browser._last_direction
+        scale = self.display_options.get_scale()
+        width, height = self.term_size()
+        current = self.file_browser.current_index
+        for i in range(1, 4):
+            idx = (current + i * direction) % len(files)
+            key = (files[idx], width, height, scale)
+            # Skip frames that are already cached or being rendered
+            if key in self._session_cache or key in self._inflight:
+                continue
+            future = self.file_browser.render_executor.submit(
+                self._render_frame, key, files[idx], scale)
+            self._inflight[key] = future
+            future.add_done_callback(
+                lambda _f, k=key: self._inflight.pop(k, None))
+
+    def term_size(self):
+        """Current terminal size from the SIGWINCH-invalidated cache"""
+        return self.image_viewer.get_terminal_size()
+
     def run(self):
         """Run main loop"""
         # Check if there are images, if not, don't setup terminal mode
         has_images = self.file_browser.get_current_image() is not None
-        
+
         if has_images:
             self.interface.setup_terminal()
-        
-        # Remember last terminal size
-        last_term_size = self.image_viewer.get_terminal_size()
-        
+
         try:
             self.refresh_display()
-            
+
+            stdin_fd = sys.stdin.fileno()
+            rlist = [stdin_fd, self._wake_r]
+
             while self.input_handler.running and has_images:
-                # Check if terminal size has changed
-                current_term_size = self.image_viewer.get_terminal_size()
-                if current_term_size != last_term_size:
-                    last_term_size = current_term_size
-                    # Terminal size changed, redraw
-                    self.refresh_display(clear_first=True)
-                
-                # Read key directly, don't use select detection
-                key = self.interface.get_key()
-                if key:
-                    # Add key to buffer
-                    self.key_buffer += key
-                    
-                    # Try to handle key sequence in buffer
-                    handled = self.input_handler.handle_input(self.key_buffer)
-                    
-                    if handled:
-                        # If handled successfully, clear buffer
-                        self.key_buffer = ""
-                    elif len(self.key_buffer) > 10:
-                        # If buffer is too long and not handled, clear it
-                        self.key_buffer = ""
-                    elif not self.key_buffer.startswith('\x1b'):
-                        # If not starting with ESC sequence, handle single character directly
-                        self.input_handler.handle_input(key)
-                        self.key_buffer = ""
-                    elif len(self.key_buffer) >= 3 and not self.input_handler.handle_input(self.key_buffer):
-                        # If ESC sequence with length>=3 but not handled, might be invalid sequence, clear it
-                        self.key_buffer = ""
-        
+                # Block until a keystroke or a signal wake-up arrives -
+                # no polling, the process sleeps between events
+                try:
+                    ready, _, _ = select.select(rlist, [], [])
+                except (OSError, ValueError):
+                    break
+
+                if self._wake_r in ready:
+                    wake = os.read(self._wake_r, 64)  # Drain wake bytes
+                    if b'q' in wake:
+                        # SIGINT - quit without waiting for another event
+                        self._shutdown()
+                        break
+                    if not self.input_handler.running:
+                        break
+                    if b'd' in wake:
+                        # A background unlink failed - report it here,
+                        # where the terminal and stdin are ours
+                        self._handle_delete_failures()
+                    if b'w' in wake:
+                        # Terminal was resized - redraw at the new geometry
+                        self.refresh_display(clear_first=True, force=True)
+
+                if stdin_fd in ready:
+                    # One read drains everything pending, so a pasted
+                    # escape sequence arrives in a single chunk
+                    data = os.read(stdin_fd, 64)
+                    if not data:
+                        break
+                    # The trie consumes each byte exactly once - no
+                    # decode, buffer concat or repeated prefix matching
+                    self.input_handler.feed(data)
+
         finally:
             if has_images:
                 self.interface.restore_terminal()
     
-    def refresh_display(self, clear_first: bool = True):
+    def refresh_display(self, clear_first: bool = True, force: bool = False):
         """Refresh display"""
         current_image = self.file_browser.get_current_image()
         if current_image:
-            # Display image, pass file_browser to support pre-rendering
-            self.image_viewer.display_image_with_info(
-                str(current_image), 
+            # Skip the redraw entirely when nothing that affects the
+            # frame has changed; callers that drew over the screen in
+            # the meantime (info pages, prompts) pass force=True
+            frame_key = (current_image,
+                         self.display_options.get_scale(),
+                         self.term_size())
+            if not force and frame_key == self._last_frame_key:
+                return
+            # Render through the session cache, then display; the
+            # browser is still passed so misses hit its pre-render cache
+            rendered = self._render_cached(current_image,
+                                           self.display_options.get_scale())
+            shown = self.image_viewer.display_image_with_info(
+                current_image,
                 self.display_options.get_scale(),
                 clear_first,
-                self.file_browser
+                self.file_browser,
+                rendered=rendered
             )
-            
-            
+            # Only remember the frame on success - after a transient
+            # render failure the next refresh must try again, not skip
+            self._last_frame_key = frame_key if shown else None
+            # Render the likely next frames while the user is looking
+            self._prefetch_ahead()
         else:
             print("No images found")
             print()
             # Show usage help and exit
-            parser = argparse.ArgumentParser(
-                description='PixelTerm - Terminal Image Viewer',
-                formatter_class=argparse.RawDescriptionHelpFormatter,
-                epilog="""
-Usage examples:
-  %(prog)s                    # Browse images in current directory
-  %(prog)s /path/to/images    # Browse images in specified directory
-  %(prog)s image.jpg          # Display specified image directly
-  %(prog)s --no-preload       # Disable preloading for faster startup
-  %(prog)s --help             # Show help information
-
-Shortcuts:
-  ←/→        Previous/Next image
-  a/d        Alternative left/right keys
-  i          Show/hide image information
-  r          Delete current image
-  q          Quit program
-  Ctrl+C     Force exit
-            """)
-            parser.add_argument('path', nargs='?', help='Image file or directory path')
-            parser.add_argument('--no-preload', action='store_false', dest='preload_enabled', 
-                                help='Disable preloading feature (enabled by default)')
-            parser.print_help()
+            sys.stdout.write(_help_text())
             self.input_handler.stop()
     
     
     
-    def next_image(self):
-        """Next image"""
-        if self.file_browser.next_image():
+    def _navigate(self, action, *, clear=True, force=False, on_fail=None):
+        """Run a navigation action and repaint on success
+
+        Shared body for all "do something, then refresh" key handlers;
+        always returns True so it can be a handler result itself.
+        """
+        if action():
+            # An open info page covers the frame; if navigation wraps
+            # back to the same image (single-image directory) the frame
+            # key is unchanged, so the repaint must be forced
+            force = force or self.info_displayed
             self.info_displayed = False  # Reset info display state
-            self.refresh_display(clear_first=True)
+            self.refresh_display(clear_first=clear, force=force)
+        elif on_fail:
+            self.interface.show_info(on_fail)
         return True
+
+    def next_image(self):
+        """Next image"""
+        return self._navigate(self.file_browser.next_image)
     
     def previous_image(self):
         """Previous image"""
-        if self.file_browser.previous_image():
-            self.info_displayed = False  # 重置信息显示状态
-            self.refresh_display(clear_first=True)
-        return True
+        return self._navigate(self.file_browser.previous_image)
     
     
     
     def zoom_in(self):
         """Zoom in"""
-        if self.display_options.zoom_in():
-            self.refresh_display()
-        else:
-            self.interface.show_info("Maximum zoom level reached")
-        return True
+        return self._navigate(self.display_options.zoom_in,
+                              on_fail="Maximum zoom level reached")
     
     def zoom_out(self):
         """Zoom out"""
-        if self.display_options.zoom_out():
-            self.refresh_display()
-        else:
-            self.interface.show_info("Minimum zoom level reached")
-        return True
+        return self._navigate(self.display_options.zoom_out,
+                              on_fail="Minimum zoom level reached")
     
     def reset_zoom(self):
         """Reset zoom"""
-        self.display_options.reset_zoom()
-        self.refresh_display()
-        return True
+        # reset_zoom has no failure mode - 'or True' makes it always refresh
+        return self._navigate(lambda: self.display_options.reset_zoom() or True)
     
     
     
@@ -233,7 +379,7 @@ Shortcuts:
         if self.info_displayed:
             # If info is displayed, hide info and re-render image
             self.info_displayed = False
-            self.refresh_display(clear_first=True)
+            self.refresh_display(clear_first=True, force=True)
         else:
             # Show image information
             self.interface.show_image_info(current_image, self.file_browser.get_image_count(), self.file_browser.current_index)
@@ -250,20 +396,27 @@ Shortcuts:
         # Confirm deletion
         with self.interface._terminal_mode_switch():
             try:
-                print(f"\nAre you sure you want to delete image '{current_image.name}'? (y/N): ", end='', flush=True)
+                print(f"\nAre you sure you want to delete image '{os.path.basename(current_image)}'? (y/N): ", end='', flush=True)
                 response = input().strip().lower()
                 if response != 'y' and response != 'yes':
                     return True
             except:
                 return True
         
-        # Delete file
+        # Delete file on a worker thread - the unlink may hit slow
+        # storage, and the browser state below doesn't depend on it.
+        # The callback puts the entry back and reports if it fails
         try:
             import os
-            os.remove(current_image)
-            
-            # Remove from file list
+            future = self.file_browser.render_executor.submit(os.remove, current_image)
+            future.add_done_callback(
+                lambda f, path=current_image: self._on_delete_done(f, path))
+
+            # Remove from file list (stored as plain strings)
             self.file_browser.image_files.remove(current_image)
+            self.file_browser._index_by_path = {
+                p: i for i, p in enumerate(self.file_browser.image_files)
+            }
             
             # If no more images after deletion, exit
             if not self.file_browser.image_files:
@@ -276,7 +429,7 @@ Shortcuts:
                 self.file_browser.current_index = 0
             
             # Refresh display
-            self.refresh_display(clear_first=True)
+            self.refresh_display(clear_first=True, force=True)
             
         except Exception as e:
             with self.interface._terminal_mode_switch():
@@ -287,14 +440,45 @@ Shortcuts:
                     pass
         
         return True
-    
+
+    def _on_delete_done(self, future, path):
+        """Completion callback for the background unlink
+
+        Runs on an executor thread, so it must not touch termios or
+        stdin - it queues the failure and wakes the main loop, which
+        does the reporting.
+        """
+        exc = future.exception()
+        if exc is None:
+            return
+        self._delete_failures.append((path, exc))
+        try:
+            os.write(self._wake_w, b'd')
+        except OSError:
+            pass
+
+    def _handle_delete_failures(self):
+        """Report failed unlinks (main loop thread only)"""
+        while self._delete_failures:
+            path, exc = self._delete_failures.pop(0)
+            # The file is still on disk - undo the optimistic removal
+            fb = self.file_browser
+            if path not in fb._index_by_path:
+                fb.image_files.append(path)
+                fb.image_files.sort()
+                fb._index_by_path = {p: i for i, p in enumerate(fb.image_files)}
+            with self.interface._terminal_mode_switch():
+                try:
+                    print(f"Deletion failed: {exc}")
+                    input("Press any key to continue...")
+                except:
+                    pass
+        self.refresh_display(clear_first=True, force=True)
+
     def go_up_directory(self):
         """Go up to parent directory"""
-        if self.file_browser.go_up_directory():
-            self.refresh_display()
-        else:
-            self.interface.show_info("Already at root directory")
-        return True
+        return self._navigate(self.file_browser.go_up_directory,
+                              on_fail="Already at root directory")
     
     def show_directory_list(self):
         """Show directory list"""
@@ -312,54 +496,40 @@ Shortcuts:
         else:
             self.interface.show_info("No subdirectories in current directory")
         
-        self.refresh_display()
+        # The prompts above wrote over the frame - always repaint
+        self.refresh_display(force=True)
         return True
     
     
     
     def refresh(self):
         """Refresh"""
-        self.file_browser.refresh_file_list()
-        self.refresh_display()
-        return True
+        return self._navigate(lambda: self.file_browser.refresh_file_list() or True,
+                              force=True)
     
     def quit(self):
         """Quit"""
-        self.input_handler.stop()
-        print("\r", flush=True)
+        self._shutdown()
         return True
 
+    def _shutdown(self):
+        """Single orderly exit path shared by 'q' and SIGINT
+
+        Stops the input loop, pushes out any buffered frame bytes and
+        restores the terminal; restore_terminal is idempotent, so the
+        finally block in run() doing it again is harmless.
+        """
+        self.input_handler.stop()
+        try:
+            sys.stdout.buffer.flush()
+        except Exception:
+            pass
+        self.interface.restore_terminal()
+
 
 def main():
     """Main function"""
-    import argparse
-    
-    parser = argparse.ArgumentParser(
-        description='PixelTerm - Terminal Image Viewer',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Usage examples:
-  %(prog)s                    # Browse images in current directory
-  %(prog)s /path/to/images    # Browse images in specified directory
-  %(prog)s image.jpg          # Display specified image directly
-  %(prog)s --no-preload       # Disable preloading for faster startup
-  %(prog)s --help             # Show help information
-
-Shortcuts:
-  ←/→        Previous/Next image
-  a/d        Alternative left/right keys
-  i          Show/hide image information
-  r          Delete current image
-  q          Quit program
-  Ctrl+C     Force exit
-        """
-    )
-    
-    parser.add_argument('path', nargs='?', help='Image file or directory path')
-    parser.add_argument('--no-preload', action='store_false', dest='preload_enabled', 
-                        help='Disable preloading feature (enabled by default)')
-    
-    args = parser.parse_args()
+    args = _PARSER.parse_args()
     
     # Check if chafa is available
     from chafa_wrapper import ChafaWrapper